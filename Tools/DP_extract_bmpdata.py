@@ -1,13 +1,35 @@
 #!/usr/bin/env python3
 import argparse
+import mmap
 import os
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple
 
+try:
+    import numpy as np
+except ImportError:  # plain-Python fallback below still works
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import _dp_lzw  # build with: python setup_dp_lzw.py build_ext --inplace
+except ImportError:
+    _dp_lzw = None
+
 ENTRY_SIZE = 32          # bytes per TOC entry
 NAME_LEN   = 20          # bytes, ASCII, NUL-padded
+ENTRY      = struct.Struct(">20sHHII")  # name, fmt1, fmt2, rel_offset, comp_size
+BMP_SIZE   = struct.Struct("<I")        # BMP file size dword at offset 2
+TGA_WH     = struct.Struct("<HH")       # TGA width/height words at offset 12
 
-def parse_header(blob: bytes):
-    """Parse the archive header.
+def parse_header(blob):
+    """Parse the archive header from any bytes-like object (bytes, memoryview, mmap).
 
     Layout:
       u32_be count
@@ -20,111 +42,248 @@ def parse_header(blob: bytes):
     """
     if len(blob) < 4:
         raise ValueError("File too small for header")
-    count = int.from_bytes(blob[:4], "big")
+    count, = struct.unpack_from(">I", blob)
     toc_len = 4 + count * ENTRY_SIZE
     if len(blob) < toc_len:
         raise ValueError("File too small for TOC")
 
-    entries = []
-    for i in range(count):
-        off = 4 + i * ENTRY_SIZE
-        name = blob[off:off+NAME_LEN].split(b"\x00", 1)[0].decode("ascii")
-        fmt1 = int.from_bytes(blob[off+20:off+22], "big")
-        fmt2 = int.from_bytes(blob[off+22:off+24], "big")
-        rel_off = int.from_bytes(blob[off+24:off+28], "big")
-        size = int.from_bytes(blob[off+28:off+32], "big")
-        entries.append((name, fmt1, fmt2, rel_off, size))
+    # One C-level unpack per entry instead of four int.from_bytes calls.
+    entries = [
+        (name.split(b"\x00", 1)[0].decode("ascii"), fmt1, fmt2, rel_off, size)
+        for name, fmt1, fmt2, rel_off, size in ENTRY.iter_unpack(blob[4:toc_len])
+    ]
     data_base = toc_len
     return count, data_base, entries
 
-def lzw_read_12bit(data: bytes) -> List[int]:
-    """Unpack 12-bit codes from bytes: three bytes → two codes.
-       Same as Elepaper Action?
-    """
-    res = []
+def _iter_codes12(data: bytes):
+    """Yield 12-bit codes straight from the packed byte stream."""
     phase = 0
     buf = 0
     for b in data:
         if phase == 0:
             buf = b << 4
         elif phase == 1:
-            res.append(buf | (b >> 4))
+            yield buf | (b >> 4)
             buf = (b & 0x0F) << 8
         else:
-            res.append(buf | b)
+            yield buf | b
         phase = (phase + 1) % 3
-    return res
 
-def lzw_decompress_12bit(codes: List[int]) -> bytes:
-    """12-bit LZW with CLEAR=256 and code space up to 4095.
-       Dictionary indices 257.. map to our dic[0..].
+def lzw_read_12bit(data: bytes):
+    """Unpack 12-bit codes from bytes: three bytes → two codes.
+       Same as Elepaper Action?
+       Returns a uint16 ndarray when NumPy is available, else a list.
     """
-    if not codes:
+    if np is not None:
+        n = len(data) // 3
+        arr = np.frombuffer(data, dtype=np.uint8, count=n * 3).reshape(-1, 3)
+        hi = (arr[:, 0].astype(np.uint16) << 4) | (arr[:, 1] >> 4)
+        lo = ((arr[:, 1] & 0x0F).astype(np.uint16) << 8) | arr[:, 2]
+        out = np.empty((n, 2), dtype=np.uint16)
+        out[:, 0] = hi
+        out[:, 1] = lo
+        codes = out.ravel()
+        if len(data) % 3 == 2:
+            # Trailing 2 bytes carry one final high code.
+            tail = (data[-2] << 4) | (data[-1] >> 4)
+            codes = np.append(codes, np.uint16(tail))
+        return codes
+
+    return list(_iter_codes12(data))
+
+if njit is not None and np is not None:
+    @njit(cache=True, boundscheck=False)
+    def _lzw_decode_codes(codes):
+        """Compiled trie decoder: uint16 codes in, uint8 bytes out."""
+        prefix = np.full(4096, -1, dtype=np.int16)
+        suffix = np.empty(4096, dtype=np.uint8)
+        for i in range(256):
+            suffix[i] = i
+        next_code = 257
+        stack = np.empty(4096, dtype=np.uint8)
+        out = np.empty(len(codes) * 4 + 16, dtype=np.uint8)
+        prev_code = codes[0]
+        out[0] = prev_code
+        n = 1
+        for k in range(1, len(codes)):
+            code = codes[k]
+            if code == 256:  # CLEAR
+                next_code = 257
+                continue
+            kwk = code == next_code
+            c = prev_code if kwk else code
+            depth = 0
+            while prefix[c] >= 0:
+                stack[depth] = suffix[c]
+                depth += 1
+                c = prefix[c]
+            if n + depth + 2 > out.size:
+                grown = np.empty(max(out.size * 2, n + depth + 2), dtype=np.uint8)
+                grown[:n] = out[:n]
+                out = grown
+            first = c
+            out[n] = first
+            n += 1
+            for j in range(depth - 1, -1, -1):
+                out[n] = stack[j]
+                n += 1
+            if kwk:
+                out[n] = first
+                n += 1
+            if next_code < 4096:
+                prefix[next_code] = prev_code
+                suffix[next_code] = first
+                next_code += 1
+            prev_code = code
+        return out[:n]
+else:
+    _lzw_decode_codes = None
+
+# Reused across calls (one copy per worker process) so decoding many small
+# entries does not reallocate the output and stack buffers every time.
+_DECODE_OUT = bytearray()
+_DECODE_STACK = bytearray()
+
+def lzw_decompress_12bit(data: bytes, max_out: int = 0) -> bytes:
+    """12-bit LZW with CLEAR=256 and code space up to 4095, decoding the
+       packed byte stream directly (codes are pulled inline, so no
+       intermediate code list is materialized).
+       Dictionary is a trie: prefix[c] points at the parent code,
+       suffix[c] is the byte appended to the parent's string.
+       If max_out is set, stop once at least that many bytes are decoded.
+    """
+    if np is not None:
+        codes = lzw_read_12bit(data)
+        if len(codes) == 0:
+            return b""
+        if _lzw_decode_codes is not None and not max_out:
+            return _lzw_decode_codes(codes).tobytes()
+        it = iter(codes)
+    else:
+        it = _iter_codes12(data)
+
+    # Codes 0..255 are literal roots (prefix -1); 257.. are filled as we go.
+    prefix = array("h", [-1]) * 4096
+    suffix = bytearray(range(256)) + bytes(4096 - 256)
+    next_code = 257
+    out = _DECODE_OUT
+    stack = _DECODE_STACK
+    del out[:]
+
+    prev_code = next(it, None)
+    if prev_code is None:
         return b""
-    out = bytearray()
-    dic = [None] * 3839  # 4096 - 257 = 3839
-    dict_size = 0
-    prev_code = codes[0]
     out.append(prev_code)
 
-    def get(idx: int) -> bytes:
-        if idx < 256:
-            return bytes([idx])
-        elif idx - 257 == dict_size:
-            # KwKwK special case
-            res = get(prev_code)
-            return res + bytes([res[0]])
-        else:
-            return dic[idx - 257]
-
-    for code in codes[1:]:
+    for code in it:
         if code == 256:  # CLEAR
-            dict_size = 0
+            next_code = 257
             continue
-        temp = get(code)
-        out.extend(temp)
-        if dict_size < 3839:
-            dic[dict_size] = get(prev_code) + bytes([temp[0]])
-            dict_size += 1
+        # KwKwK: the code being defined right now; decode prev and
+        # re-append its first byte below.
+        kwk = code == next_code
+        c = prev_code if kwk else code
+        # Walk up to the root, collecting suffix bytes in reverse.
+        del stack[:]
+        while prefix[c] >= 0:
+            stack.append(suffix[c])
+            c = prefix[c]
+        first = c  # root code == first byte of the string
+        out.append(first)
+        stack.reverse()
+        out.extend(stack)
+        if kwk:
+            out.append(first)
+        if next_code < 4096:
+            prefix[next_code] = prev_code
+            suffix[next_code] = first
+            next_code += 1
         prev_code = code
+        if max_out and len(out) >= max_out:
+            break
     return bytes(out)
 
-def extract(bin_path: str, out_dir: str, list_only: bool = False) -> None:
+def decompress_entry(comp: bytes) -> bytes:
+    """Decompress one archive payload, using the fastest available kernel."""
+    if _dp_lzw is not None:
+        return _dp_lzw.decompress12(comp)
+    return lzw_decompress_12bit(comp)
+
+def peek_entry(comp: bytes, max_out: int = 16) -> bytes:
+    """Decode only the first max_out bytes of an entry (for header peeks).
+
+    Every code emits at least one byte and occupies 1.5 packed bytes, so a
+    small prefix of the stream is guaranteed to cover the peek."""
+    need = (max_out * 3 + 3) // 2 + 3
+    return lzw_decompress_12bit(comp[:need], max_out=max_out)
+
+def map_entries(func, items):
+    """Apply func to every item, in order, spreading over worker processes
+    when there is enough work to amortize the pool startup."""
+    cpus = os.cpu_count() or 1
+    if len(items) < 2 or cpus < 2:
+        return [func(it) for it in items]
+    with ProcessPoolExecutor() as ex:
+        chunk = max(1, len(items) // (cpus * 4))
+        return list(ex.map(func, items, chunksize=chunk))
+
+def extract(bin_path: str, out_dir: str, list_only: bool = False,
+            peek_only: bool = False) -> None:
+    # mmap instead of read(): the TOC is parsed via zero-copy memoryview
+    # slices and only the payloads actually used are copied out.
     with open(bin_path, "rb") as f:
-        blob = f.read()
+        try:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # zero-length file
+            blob = f.read()
 
-    count, base, entries = parse_header(blob)
+    mv = memoryview(blob)
+    try:
+        count, base, entries = parse_header(mv)
+
+        # Each entry's LZW stream is independent: decompress them in parallel.
+        decomps = None
+        if peek_only:
+            # Only the first 16 decompressed bytes are needed for the log.
+            decomps = [peek_entry(bytes(mv[base + rel: base + rel + size]))
+                       for (_name, _f1, _f2, rel, size) in entries]
+        elif not list_only:
+            comps = [bytes(mv[base + rel: base + rel + size])
+                     for (_name, _f1, _f2, rel, size) in entries]
+            decomps = map_entries(decompress_entry, comps)
+    finally:
+        mv.release()
+        if isinstance(blob, mmap.mmap):
+            blob.close()
 
     # Log header
     print(f'{"#":>3} {"Name":<30} {"Comp":>8} {"->":>2} {"Hdr/Size":>8} {"@":>2} {"Offset":>10}')
     print("-" * 70)
 
     for idx, (name, fmt1, fmt2, rel_off, comp_size) in enumerate(entries, 1):
-        comp = blob[base + rel_off: base + rel_off + comp_size]
-
         # Peek at post-decompression header dword for the pretty log (no need to fully save if listing)
         hdr_hex = ""
-        if not list_only:
-            codes = lzw_read_12bit(comp)
-            decomp = lzw_decompress_12bit(codes)
-            if name.lower().endswith(".bmp") and len(decomp) >= 6 and decomp[:2] == b"BM":
+        if decomps is not None:
+            decomp = decomps[idx - 1]
+            ext = os.path.splitext(name)[1].lower()
+            if ext == ".bmp" and len(decomp) >= 6 and decomp[:2] == b"BM":
                 # BMP: DWORD file size at bytes 2..5 (little-endian)
-                hdr_hex = f"{int.from_bytes(decomp[2:6], 'little'):X}"
-            elif name.lower().endswith(".tga") and len(decomp) >= 0x10:
+                hdr_hex = f"{BMP_SIZE.unpack_from(decomp, 2)[0]:X}"
+            elif ext == ".tga" and len(decomp) >= 0x10:
                 # TGA (uncompressed truecolor often has 0,0,2,0,0, etc.)
                 # For consistency with log, show width/height word-pair (little-endian)
-                w = int.from_bytes(decomp[12:14], "little") if len(decomp) >= 14 else 0
-                h = int.from_bytes(decomp[14:16], "little") if len(decomp) >= 16 else 0
+                w, h = TGA_WH.unpack_from(decomp, 12)
                 hdr_hex = f"{(w<<16)|h:X}"
             else:
                 # Fallback: show the two fmt words from the TOC
                 hdr_hex = f"{(fmt1<<16)|fmt2:X}"
 
             # Write file
-            out_path = os.path.join(out_dir, name)
-            os.makedirs(os.path.dirname(out_path), exist_ok=True)
-            with open(out_path, "wb") as outf:
-                outf.write(decomp)
+            if not peek_only:
+                out_path = os.path.join(out_dir, name)
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                with open(out_path, "wb", buffering=1 << 20) as outf:
+                    outf.write(decomp)
         else:
             hdr_hex = f"{(fmt1<<16)|fmt2:X}"
 
@@ -135,8 +294,10 @@ def main():
     ap.add_argument("bin", help="Path to BMPDATA.BIN")
     ap.add_argument("outdir", help="Directory to write extracted files")
     ap.add_argument("--list", action="store_true", help="List contents without extracting")
+    ap.add_argument("--peek", action="store_true",
+                    help="Like --list, but also decode each entry's header for the log")
     args = ap.parse_args()
-    extract(args.bin, args.outdir, list_only=args.list)
+    extract(args.bin, args.outdir, list_only=args.list, peek_only=args.peek)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
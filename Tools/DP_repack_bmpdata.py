@@ -1,36 +1,138 @@
 #!/usr/bin/env python3
-import argparse, os, sys
+import argparse, mmap, os, struct, sys
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple
 
+try:
+    import numpy as np
+except ImportError:  # plain-Python fallback below still works
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import _dp_lzw  # build with: python setup_dp_lzw.py build_ext --inplace
+except ImportError:
+    _dp_lzw = None
+
 ENTRY_SIZE = 32
 NAME_LEN   = 20
+ENTRY      = struct.Struct(">20sHHII")  # name, fmt1, fmt2, rel_offset, comp_size
+TGA_WH     = struct.Struct("<HH")       # TGA width/height words at offset 12
 
 # ---------- LZW 12-bit (matches the other game's tool) ----------
-def lzw_compress(data: bytes) -> List[int]:
-    """12-bit LZW without CLEAR code; codes 0..255 are literals, next IDs start at 257."""
+if njit is not None and np is not None:
+    @njit(cache=True, boundscheck=False)
+    def _lzw_encode_bytes(data):
+        """Compiled encoder: uint8 bytes in, uint16 codes out.
+        The trie is a flat (node, byte) -> child table; -1 means absent."""
+        children = np.full((4096, 256), -1, dtype=np.int16)
+        out = np.empty(len(data), dtype=np.uint16)  # one code per byte, worst case
+        n = 0
+        next_id = 257
+        node = np.int32(data[0])
+        for k in range(1, len(data)):
+            b = data[k]
+            nxt = children[node, b]
+            if nxt >= 0:
+                node = np.int32(nxt)
+            else:
+                out[n] = node
+                n += 1
+                if next_id < 4096:
+                    children[node, b] = next_id
+                    next_id += 1
+                node = np.int32(b)
+        out[n] = node
+        n += 1
+        return out[:n]
+else:
+    _lzw_encode_bytes = None
+
+class BitWriter12:
+    """Packs 12-bit codes into the nibble-interleaved stream as they are
+    emitted, so a fused encode never builds the intermediate code list."""
+    __slots__ = ("out", "_pending")
+
+    def __init__(self):
+        self.out = bytearray()
+        self._pending = -1  # buffered high code of the current pair
+
+    def emit(self, code: int) -> None:
+        pend = self._pending
+        if pend < 0:
+            self._pending = code
+        else:
+            out = self.out
+            out.append((pend >> 4) & 0xFF)
+            out.append(((pend & 0x0F) << 4) | (code >> 8))
+            out.append(code & 0xFF)
+            self._pending = -1
+
+    def finalize(self) -> bytes:
+        if self._pending >= 0:
+            # Odd code count: high byte plus high nibble, low nibble zero.
+            self.out.append((self._pending >> 4) & 0xFF)
+            self.out.append((self._pending & 0x0F) << 4)
+            self._pending = -1
+        return bytes(self.out)
+
+def lzw_compress(data: bytes, writer: "BitWriter12" = None):
+    """12-bit LZW without CLEAR code; codes 0..255 are literals, next IDs start at 257.
+
+    The dictionary is a trie of int node ids: children[node] maps the next
+    byte to the child id, so extending a match never allocates or hashes a
+    bytes key.
+
+    Returns the code list, or the packed bytes when a BitWriter12 is
+    passed (codes then go straight into the writer).
+    """
     if not data:
-        return []
+        return writer.finalize() if writer is not None else []
+    if writer is None and _lzw_encode_bytes is not None:
+        return _lzw_encode_bytes(np.frombuffer(data, dtype=np.uint8))
     out: List[int] = []
-    dic: Dict[bytes, int] = {}
+    emit = out.append if writer is None else writer.emit
+    children: List[Dict[int, int]] = [{} for _ in range(4096)]
     next_id = 257
 
-    prev = bytes([data[0]])
+    node = data[0]
     for b in data[1:]:
-        b = bytes([b])
-        seq = prev + b
-        if seq in dic:
-            prev = seq
+        nxt = children[node].get(b)
+        if nxt is not None:
+            node = nxt
         else:
-            out.append(dic[prev] if len(prev) > 1 else prev[0])
+            emit(node)
             if next_id < 4096:
-                dic[seq] = next_id
+                children[node][b] = next_id
                 next_id += 1
-            prev = b
-    out.append(dic[prev] if len(prev) > 1 else prev[0])
+            node = b
+    emit(node)
+    if writer is not None:
+        return writer.finalize()
     return out
 
 def lzw_write_12bit(codes: List[int]) -> bytes:
     """Pack 12-bit codes into bytes: 3 bytes -> 2 codes pattern (nibble interleave)."""
+    if np is not None:
+        n = len(codes)
+        if n == 0:
+            return b""
+        arr = np.asarray(codes, dtype=np.uint16)
+        if n % 2:
+            arr = np.append(arr, np.uint16(0))
+        pair = arr.reshape(-1, 2)
+        packed = np.empty((len(pair), 3), dtype=np.uint8)
+        packed[:, 0] = pair[:, 0] >> 4
+        packed[:, 1] = ((pair[:, 0] & 0x0F) << 4) | (pair[:, 1] >> 8)
+        packed[:, 2] = pair[:, 1] & 0xFF
+        out = packed.tobytes()
+        # An odd final code only contributes 2 bytes (high byte + nibble).
+        return out[:-1] if n % 2 else out
+
     phase = True
     buf = 0
     res = bytearray()
@@ -46,29 +148,56 @@ def lzw_write_12bit(codes: List[int]) -> bytes:
         res.append((buf << 4) & 0xF0)
     return bytes(res)
 
+def compress_entry(data: bytes) -> bytes:
+    """Compress one file into a packed 12-bit LZW payload, using the
+    fastest available kernel."""
+    if _dp_lzw is not None:
+        return _dp_lzw.compress12(data)
+    if _lzw_encode_bytes is not None:
+        return lzw_write_12bit(lzw_compress(data))
+    return lzw_compress(data, BitWriter12())
+
+def map_entries(func, items):
+    """Apply func to every item, in order, spreading over worker processes
+    when there is enough work to amortize the pool startup."""
+    cpus = os.cpu_count() or 1
+    if len(items) < 2 or cpus < 2:
+        return [func(it) for it in items]
+    with ProcessPoolExecutor() as ex:
+        chunk = max(1, len(items) // (cpus * 4))
+        return list(ex.map(func, items, chunksize=chunk))
+
 # ---------- Archive helpers ----------
 def read_template_header(path: str):
-    """Parse an existing BMPDATA.BIN header (big-endian)."""
+    """Parse an existing BMPDATA.BIN header (big-endian).
+
+    The file is mmapped and the TOC read through memoryview slices, so
+    the data section is never pulled into memory."""
     with open(path, "rb") as f:
-        blob = f.read()
-    if len(blob) < 4:
-        raise ValueError("Template is too small")
-
-    count = int.from_bytes(blob[:4], "big")
-    base = 4 + count * ENTRY_SIZE
-    if len(blob) < base:
-        raise ValueError("Template truncated before data section")
-
-    entries = []
-    for i in range(count):
-        off = 4 + i * ENTRY_SIZE
-        name = blob[off:off+NAME_LEN].split(b"\x00", 1)[0].decode("ascii", "ignore")
-        fmt1 = int.from_bytes(blob[off+20:off+22], "big")
-        fmt2 = int.from_bytes(blob[off+22:off+24], "big")
-        rel  = int.from_bytes(blob[off+24:off+28], "big")
-        size = int.from_bytes(blob[off+28:off+32], "big")
-        entries.append((name, fmt1, fmt2, rel, size))
-    return count, base, entries
+        try:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # zero-length file
+            blob = f.read()
+    mv = memoryview(blob)
+    try:
+        if len(mv) < 4:
+            raise ValueError("Template is too small")
+
+        count, = struct.unpack_from(">I", mv)
+        base = 4 + count * ENTRY_SIZE
+        if len(mv) < base:
+            raise ValueError("Template truncated before data section")
+
+        # One C-level unpack per entry instead of four int.from_bytes calls.
+        entries = [
+            (name.split(b"\x00", 1)[0].decode("ascii", "ignore"), fmt1, fmt2, rel, size)
+            for name, fmt1, fmt2, rel, size in ENTRY.iter_unpack(mv[4:base])
+        ]
+        return count, base, entries
+    finally:
+        mv.release()
+        if isinstance(blob, mmap.mmap):
+            blob.close()
 
 def sanitize_name(name: str) -> bytes:
     n = name.encode("ascii", "ignore")
@@ -82,18 +211,17 @@ def compute_fmt_words(name: str, data: bytes, template_map=None) -> Tuple[int, i
     if template_map and name in template_map:
         return template_map[name]
 
-    lower = name.lower()
-    if lower.endswith(".bmp"):
+    ext = os.path.splitext(name)[1].lower()
+    if ext == ".bmp":
         # For this game, the two words mirror the decompressed BMP file size (split 16/16).
         full = len(data)
         return (full >> 16) & 0xFFFF, full & 0xFFFF
 
-    if lower.endswith(".tga"):
+    if ext == ".tga":
         # TGA width/height from header at 12..15 (little-endian)
         if len(data) < 16:
             raise ValueError(f"TGA '{name}' is too small to read width/height.")
-        width  = int.from_bytes(data[12:14], "little")
-        height = int.from_bytes(data[14:16], "little")
+        width, height = TGA_WH.unpack_from(data, 12)
 
         # Two encodings seen in the original:
         #  A) fmt1 = width // 16 (when width is a multiple of 16), fmt2 = height
@@ -111,17 +239,31 @@ def compute_fmt_words(name: str, data: bytes, template_map=None) -> Tuple[int, i
     return (full >> 16) & 0xFFFF, full & 0xFFFF
 
 def gather_inputs(root: str) -> List[Tuple[str, bytes]]:
+    """Collect (archive name, data) pairs under root.
+
+    Recurses with os.scandir so directory/file checks reuse the stat
+    cached by the OS, and reads each file with its exact size so the
+    buffer is allocated once."""
     items = []
-    for dirpath, _, files in os.walk(root):
-        for fn in files:
-            path = os.path.join(dirpath, fn)
-            # Normalize to archive-friendly path (flat, like the original)
-            rel = os.path.relpath(path, root)
-            if os.sep != "/":
-                rel = rel.replace(os.sep, "/")
-            with open(path, "rb") as f:
-                data = f.read()
-            items.append((rel, data))
+
+    def walk(dirpath: str) -> None:
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    walk(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                # Normalize to archive-friendly path (flat, like the original)
+                rel = os.path.relpath(entry.path, root)
+                if os.sep != "/":
+                    rel = rel.replace(os.sep, "/")
+                size = entry.stat().st_size
+                with open(entry.path, "rb") as f:
+                    data = f.read(size)
+                items.append((rel, data))
+
+    walk(root)
     if not items:
         raise ValueError("No files found to pack.")
     return items
@@ -129,14 +271,12 @@ def gather_inputs(root: str) -> List[Tuple[str, bytes]]:
 def build_header(entries: List[Tuple[str, int, int, int, int]]) -> bytes:
     """entries: list of (name, fmt1, fmt2, rel_off, comp_size)."""
     count = len(entries)
-    head = bytearray()
-    head += count.to_bytes(4, "big")
+    head = bytearray(4 + count * ENTRY_SIZE)  # sized once, no regrowth
+    head[:4] = count.to_bytes(4, "big")
+    off = 4
     for name, fmt1, fmt2, rel, comp_size in entries:
-        head += sanitize_name(name)
-        head += fmt1.to_bytes(2, "big")
-        head += fmt2.to_bytes(2, "big")
-        head += rel.to_bytes(4, "big")
-        head += comp_size.to_bytes(4, "big")
+        ENTRY.pack_into(head, off, sanitize_name(name), fmt1, fmt2, rel, comp_size)
+        off += ENTRY_SIZE
     return bytes(head)
 
 def repack(input_dir: str, out_path: str, template_path: str = None, strict: bool = False):
@@ -171,14 +311,18 @@ def repack(input_dir: str, out_path: str, template_path: str = None, strict: boo
         # Deterministic order if no template
         files.sort(key=lambda x: x[0])
 
-    # Compress and collect metadata
-    compressed_chunks = []
+    # Fully templated repacks (the common case) can take the fmt words
+    # straight from the template and skip header sniffing per entry.
+    if template_map and all(n in template_map for n, _d in files):
+        fmt_words = lambda name, data: template_map[name]
+    else:
+        fmt_words = lambda name, data: compute_fmt_words(name, data, template_map)
+
+    # Compress (independent per file, so in parallel) and collect metadata
+    compressed_chunks = map_entries(compress_entry, [d for _n, d in files])
     meta: List[Tuple[str, int, int, int, int]] = []  # name, fmt1, fmt2, rel_off, comp_size
-    for name, data in files:
-        codes = lzw_compress(data)
-        comp = lzw_write_12bit(codes)
-        compressed_chunks.append(comp)
-        fmt1, fmt2 = compute_fmt_words(name, data, template_map)
+    for (name, data), comp in zip(files, compressed_chunks):
+        fmt1, fmt2 = fmt_words(name, data)
         # rel_off will be filled after we know the header size
         meta.append((name, fmt1, fmt2, 0, len(comp)))
 
@@ -194,11 +338,10 @@ def repack(input_dir: str, out_path: str, template_path: str = None, strict: boo
     # Build header
     header = build_header(fixed_meta)
 
-    # Write archive
-    with open(out_path, "wb") as outf:
+    # Write archive (one buffered writer; writelines loops at C level)
+    with open(out_path, "wb", buffering=1 << 20) as outf:
         outf.write(header)
-        for comp in compressed_chunks:
-            outf.write(comp)
+        outf.writelines(compressed_chunks)
 
     print(f"Packed {len(fixed_meta)} file(s) into: {out_path}")
     print(f"Header size: {header_len} bytes, Data size: {cursor} bytes, Total: {header_len + cursor} bytes")
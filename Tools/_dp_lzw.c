@@ -0,0 +1,264 @@
+/* Optional C kernels for the BMPDATA.BIN tools.
+ *
+ * Fuses the 12-bit code packing/unpacking into the LZW coder so the
+ * intermediate code list never exists:
+ *
+ *   decompress12(bytes) -> bytes   (12-bit LZW, CLEAR=256, trie decoder)
+ *   compress12(bytes)   -> bytes   (12-bit LZW, no CLEAR, IDs from 257)
+ *
+ * The bit I/O works on whole 3-byte groups (two codes each) instead of
+ * a per-byte phase machine, so the hot loops carry no shift-register
+ * state and no phase branches.
+ *
+ * Build in place with:  python setup_dp_lzw.py build_ext --inplace
+ * The Python tools fall back to their interpreted paths when this
+ * module is not built.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+/* ---------- decompress ---------- */
+
+typedef struct {
+    int16_t prefix[4096];
+    uint8_t suffix[4096];
+    uint8_t stack[4096];
+    uint8_t *out;
+    Py_ssize_t n;
+    Py_ssize_t cap;
+    int next_code;
+    int prev_code;
+} dec_state;
+
+/* Decode one 12-bit code. Returns 0, or -1 (corrupt), or -2 (no memory). */
+static inline int
+dec_step(dec_state *st, int code)
+{
+    int kwk, c, depth;
+    uint8_t first;
+
+    if (code == 256) { /* CLEAR */
+        st->next_code = 257;
+        return 0;
+    }
+    if (st->prev_code < 0) { /* first code is always a literal */
+        st->out[st->n++] = (uint8_t)code;
+        st->prev_code = code;
+        return 0;
+    }
+
+    kwk = (code == st->next_code);
+    c = kwk ? st->prev_code : code;
+    depth = 0;
+    while (st->prefix[c] >= 0) {
+        if (depth >= 4096)
+            return -1; /* dictionary cycle in corrupt stream */
+        st->stack[depth++] = st->suffix[c];
+        c = st->prefix[c];
+    }
+    if (st->n + depth + 2 > st->cap) {
+        Py_ssize_t newcap = st->cap * 2;
+        uint8_t *tmp;
+        while (newcap < st->n + depth + 2)
+            newcap *= 2;
+        tmp = PyMem_Realloc(st->out, newcap);
+        if (tmp == NULL)
+            return -2;
+        st->out = tmp;
+        st->cap = newcap;
+    }
+    first = (uint8_t)c;
+    st->out[st->n++] = first;
+    while (depth > 0)
+        st->out[st->n++] = st->stack[--depth];
+    if (kwk)
+        st->out[st->n++] = first;
+    if (st->next_code < 4096) {
+        st->prefix[st->next_code] = (int16_t)st->prev_code;
+        st->suffix[st->next_code] = first;
+        st->next_code++;
+    }
+    st->prev_code = code;
+    return 0;
+}
+
+static PyObject *
+dp_decompress12(PyObject *self, PyObject *arg)
+{
+    Py_buffer view;
+    dec_state *st;
+    const uint8_t *in;
+    Py_ssize_t in_len, groups, g;
+    int i, err = 0;
+    PyObject *res;
+
+    if (PyObject_GetBuffer(arg, &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+    in = (const uint8_t *)view.buf;
+    in_len = view.len;
+
+    st = PyMem_Malloc(sizeof(dec_state));
+    if (st == NULL) {
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+    for (i = 0; i < 4096; i++)
+        st->prefix[i] = -1;
+    for (i = 0; i < 256; i++)
+        st->suffix[i] = (uint8_t)i;
+    st->cap = in_len * 3 + 16;
+    st->n = 0;
+    st->out = PyMem_Malloc(st->cap);
+    if (st->out == NULL) {
+        PyMem_Free(st);
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+    st->next_code = 257;
+    st->prev_code = -1;
+
+    /* Two codes per 3-byte group; no phase or bit-count tracking. */
+    groups = in_len / 3;
+    for (g = 0; g < groups; g++) {
+        const uint8_t *p = in + g * 3;
+        int c0 = (p[0] << 4) | (p[1] >> 4);
+        int c1 = ((p[1] & 0x0F) << 8) | p[2];
+        if ((err = dec_step(st, c0)) != 0 || (err = dec_step(st, c1)) != 0)
+            break;
+    }
+    if (err == 0 && in_len % 3 == 2) {
+        /* trailing 2 bytes carry one final high code */
+        err = dec_step(st, (in[in_len - 2] << 4) | (in[in_len - 1] >> 4));
+    }
+
+    PyBuffer_Release(&view);
+    if (err != 0) {
+        PyMem_Free(st->out);
+        PyMem_Free(st);
+        if (err == -1) {
+            PyErr_SetString(PyExc_ValueError,
+                            "corrupt LZW stream (dictionary cycle)");
+            return NULL;
+        }
+        return PyErr_NoMemory();
+    }
+    res = PyBytes_FromStringAndSize((const char *)st->out, st->n);
+    PyMem_Free(st->out);
+    PyMem_Free(st);
+    return res;
+}
+
+/* ---------- compress ---------- */
+
+typedef struct {
+    uint8_t *out;
+    Py_ssize_t n;
+    int pending; /* buffered high code of the current pair, or -1 */
+} enc_out;
+
+/* Emit one 12-bit code; every second code flushes a whole 3-byte group. */
+static inline void
+emit12(enc_out *eo, int code)
+{
+    if (eo->pending < 0) {
+        eo->pending = code;
+    } else {
+        uint8_t *p = eo->out + eo->n;
+        p[0] = (uint8_t)(eo->pending >> 4);
+        p[1] = (uint8_t)(((eo->pending & 0x0F) << 4) | (code >> 8));
+        p[2] = (uint8_t)(code & 0xFF);
+        eo->n += 3;
+        eo->pending = -1;
+    }
+}
+
+static PyObject *
+dp_compress12(PyObject *self, PyObject *arg)
+{
+    Py_buffer view;
+    const uint8_t *in;
+    Py_ssize_t in_len, k;
+    int16_t *children;
+    enc_out eo;
+    int next_id, node;
+    PyObject *res;
+
+    if (PyObject_GetBuffer(arg, &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+    in = (const uint8_t *)view.buf;
+    in_len = view.len;
+
+    if (in_len == 0) {
+        PyBuffer_Release(&view);
+        return PyBytes_FromStringAndSize(NULL, 0);
+    }
+
+    /* (node, byte) -> child id; -1 means absent */
+    children = PyMem_Malloc(4096 * 256 * sizeof(int16_t));
+    if (children == NULL) {
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+    memset(children, 0xFF, 4096 * 256 * sizeof(int16_t));
+
+    /* at most one code per input byte -> 1.5 bytes + padding */
+    eo.n = 0;
+    eo.pending = -1;
+    eo.out = PyMem_Malloc((in_len * 3) / 2 + 4);
+    if (eo.out == NULL) {
+        PyMem_Free(children);
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+
+    next_id = 257;
+    node = in[0];
+    for (k = 1; k < in_len; k++) {
+        int b = in[k];
+        int16_t nxt = children[(node << 8) | b];
+        if (nxt >= 0) {
+            node = nxt;
+        } else {
+            emit12(&eo, node);
+            if (next_id < 4096)
+                children[(node << 8) | b] = (int16_t)next_id++;
+            node = b;
+        }
+    }
+    emit12(&eo, node);
+    if (eo.pending >= 0) {
+        /* odd code count: high byte plus high nibble, low nibble zero */
+        eo.out[eo.n++] = (uint8_t)(eo.pending >> 4);
+        eo.out[eo.n++] = (uint8_t)((eo.pending & 0x0F) << 4);
+    }
+
+    PyMem_Free(children);
+    PyBuffer_Release(&view);
+    res = PyBytes_FromStringAndSize((const char *)eo.out, eo.n);
+    PyMem_Free(eo.out);
+    return res;
+}
+
+/* ---------- module ---------- */
+
+static PyMethodDef dp_lzw_methods[] = {
+    {"decompress12", dp_decompress12, METH_O,
+     "Decompress a packed 12-bit LZW stream to bytes."},
+    {"compress12", dp_compress12, METH_O,
+     "Compress bytes to a packed 12-bit LZW stream."},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef dp_lzw_module = {
+    PyModuleDef_HEAD_INIT, "_dp_lzw",
+    "Fused 12-bit LZW kernels for the BMPDATA.BIN tools.",
+    -1, dp_lzw_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__dp_lzw(void)
+{
+    return PyModule_Create(&dp_lzw_module);
+}
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""Build the optional _dp_lzw C extension next to the tools:
+
+    python setup_dp_lzw.py build_ext --inplace
+
+The extract/repack scripts pick it up automatically and fall back to
+pure Python when it is absent.
+"""
+from setuptools import Extension, setup
+
+setup(
+    name="dp-lzw",
+    version="1.0",
+    ext_modules=[Extension("_dp_lzw", ["_dp_lzw.c"], extra_compile_args=["-O2"])],
+)